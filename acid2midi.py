@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 import sys
+import os
 import time
 import subprocess
 import re
+import operator
+import functools
+import ctypes
+import threading
+import concurrent.futures
 import rtmidi
-import heapq
 import random
 
 # Character sets
@@ -21,7 +26,10 @@ DEFAULT_TEXT = "....... Ahhhhhhhhhhhhhhh 1234567890, What is this? What is this?
 # Timing constants
 BPM = 130
 TICKS_PER_BEAT = 4
-TICK_DURATION = 60.0 / BPM / TICKS_PER_BEAT
+TICK_NS = 60 * 1_000_000_000 // (BPM * TICKS_PER_BEAT)  # Integer nanoseconds per tick
+SPIN_NS = 1_000_000  # Busy-wait the last 1 ms before each deadline; sleep() wakeups alone jitter
+RT_PRIORITY = 80  # SCHED_FIFO priority for playback
+MCL_CURRENT, MCL_FUTURE = 1, 2  # mlockall() flags from <sys/mman.h>
 
 # ATTENTION AI: IN FL STUDIO C-4 IS 48!!!! NOT 50!!!!
 
@@ -29,6 +37,7 @@ TICK_DURATION = 60.0 / BPM / TICKS_PER_BEAT
 NOTE_BASE = 48  # C4 for TB-303 basslines
 OCTAVE = 12
 MINOR_PENTATONIC = [0, 3, 5, 7, 10]  # C, Eb, F, G, Bb
+PENTA_LUT = tuple(MINOR_PENTATONIC[i % len(MINOR_PENTATONIC)] for i in range(128))  # Wrapped scale lookup by rank
 PAD_CHORD_NOTES = [0, 3, 7]  # Root, minor 3rd, 5th for ambient chords
 
 # DONT FUCKING CHANGE THIS, IT IS THE CORRECT MAPPING IN VST
@@ -45,6 +54,40 @@ DRUM_NOTES = {
     'ride': 64     # E5
 }
 
+def build_char_table():
+    """Precompute (class, TB303 note, TB303 velocity, drum note, drum velocity) per character the loop handles"""
+    table = {ch: ('space', None, None, None, None) for ch in PUNCTUATION | {' '}}
+    for ch in ENCODABLE:
+        if ch in VOWELS:
+            kind, rank, velocity = 'vowel', VOWEL_ORDER.index(ch), 80
+            drum_note, drum_velocity = DRUM_NOTES['kick'], 100
+        elif ch in DIGITS:
+            kind, rank, velocity = 'digit', int(ch), 70
+            drum_note, drum_velocity = DRUM_NOTES['oh'], 80
+        else:
+            # Consonant drums depend on the character position, picked in the loop
+            kind, rank, velocity = 'consonant', CONSONANT_ORDER.index(ch), 100
+            drum_note, drum_velocity = None, None
+        scale_degree = PENTA_LUT[rank]
+        note = NOTE_BASE + scale_degree
+        note = min(max(note, 0), 127)
+        table[ch] = (kind, note, velocity, drum_note, drum_velocity)
+    return table
+
+CHAR_TABLE = build_char_table()
+# Consonant (drum note, velocity) by character position mod 4: clap, hat, snare, hat
+CONSONANT_DRUMS = tuple((DRUM_NOTES[drum], 90 if drum in ('snare', 'clap') else 70)
+                        for drum in ('clap', 'ch', 'snare', 'ch'))
+CHAR_RE = re.compile('[' + re.escape(''.join(sorted(CHAR_TABLE))) + ']')  # Matches only characters with a table entry
+
+# TB303 parameters per character class: chance of a 2-tick glide, then the
+# extra CC number and value, if any
+TB303_PARAMS = {
+    'vowel': (0.6, None, None),
+    'digit': (0, None, None),
+    'consonant': (0, 71, 80)  # Resonance
+}
+
 # Device mapping to ALSA ports
 DEVICES = {
     'TB303': ('TextMIDI_TB303', 'virtual-1'),
@@ -53,31 +96,66 @@ DEVICES = {
     'PadSynth': ('TextMIDI_PadSynth', 'virtual-4')
 }
 
-def get_alsa_ports():
-    """Parse `aconnect -l` and return dict of client_name:port_name -> client:port"""
-    try:
-        out = subprocess.check_output(['aconnect', '-l'], text=True)
+# Event actions, stored as small ints; MIDI ones index STATUS_BYTES, PRINT echoes a character
+ON, OFF, CC, PRINT = 0, 1, 2, 3
+
+# MIDI status bytes per event action (every device plays on channel 1)
+STATUS_BYTES = (0x90, 0x80, 0xB0)
+
+@functools.lru_cache(maxsize=None)
+def midi_message(status, value, param):
+    """Return the raw 3-byte MIDI message, shared between all identical events"""
+    return bytes((status, value, param))
+
+# `aconnect -l` client and port lines in one pattern, compiled once
+ACONNECT_RE = re.compile(r'^client (\d+): \'([^\']+)\'|^[ \t]+(\d+) \'([^\']+)\'', re.M)
+ALSA_PORTS_CACHE = {'time_ns': None, 'ports': {}}  # Last parsed `aconnect -l` and when it was started
+ALSA_PORTS_LOCK = threading.Lock()  # One `aconnect -l` at a time; workers waiting on it reuse its result
+PORT_POLL_S = 0.05  # How often to look for freshly opened virtual ports
+PORT_WAIT_S = 2.0   # Stop waiting for them after this long
+
+def get_alsa_ports(since_ns=None):
+    """Parse `aconnect -l` and return dict of client_name:port_name -> client:port
+
+    A listing started after since_ns (perf_counter_ns clock) is reused instead
+    of running `aconnect -l` again; since_ns=None always runs it.
+    """
+    with ALSA_PORTS_LOCK:
+        now = time.perf_counter_ns()
+        cached_at = ALSA_PORTS_CACHE['time_ns']
+        if since_ns is not None and cached_at is not None and cached_at > since_ns:
+            return dict(ALSA_PORTS_CACHE['ports'])
+        try:
+            out = subprocess.check_output(['aconnect', '-l'], text=True)
+        except subprocess.CalledProcessError:
+            return {}
         ports = {}
         current_client = None
         current_client_name = None
-        for line in out.splitlines():
-            client_match = re.match(r'^client (\d+): \'([^\']+)\'', line)
-            if client_match:
-                current_client = client_match.group(1)
-                current_client_name = client_match.group(2)
-            port_match = re.match(r'\s+(\d+) \'([^\']+)\'', line)
-            if current_client and port_match:
-                port_num, port_name = port_match.groups()
+        for m in ACONNECT_RE.finditer(out):
+            client, client_name, port_num, port_name = m.groups()
+            if client:
+                current_client = client
+                current_client_name = client_name
+            elif current_client:
                 key = f"{current_client_name}:{port_name.strip()}"
                 ports[key] = f"{current_client}:{port_num}"
-        return ports
-    except subprocess.CalledProcessError:
-        return {}
+        ALSA_PORTS_CACHE['time_ns'] = now
+        ALSA_PORTS_CACHE['ports'] = ports
+        return dict(ports)
 
-def connect_midi_ports(src_name, dst_name):
-    """Connect source port to destination port, retrying up to 5 times"""
-    for _ in range(5):
+def wait_for_ports(port_names):
+    """Poll `aconnect -l` until every named port is listed (or PORT_WAIT_S passes) and return the port map"""
+    deadline = time.monotonic() + PORT_WAIT_S
+    while True:
         ports = get_alsa_ports()
+        if all(any(name in key for key in ports) for name in port_names) or time.monotonic() >= deadline:
+            return ports
+        time.sleep(PORT_POLL_S)
+
+def connect_midi_ports(src_name, dst_name, ports):
+    """Connect source port to destination port, retrying up to 5 times (re-reads the ports only if one is missing)"""
+    for _ in range(5):
         src = next((v for k, v in ports.items() if src_name in k), None)
         dst = next((v for k, v in ports.items() if dst_name in k), None)
         if src and dst:
@@ -90,124 +168,142 @@ def connect_midi_ports(src_name, dst_name):
                 time.sleep(0.5)
         else:
             print(f"Warning: Port not found: {src_name if not src else dst_name}")
+            retry_ns = time.perf_counter_ns()
             time.sleep(0.5)
+            # Any listing started after this retry began is fresh enough, so workers
+            # retrying side by side share one `aconnect -l` run
+            ports = get_alsa_ports(since_ns=retry_ns)
     return False
 
 def text_to_event_queue(text):
-    random.seed(text)  # Deterministic mapping for decodability
+    rng = random.Random(text)  # Deterministic mapping for decodability
+    rand = rng.random
     event_queue = []
     char_timing = []
-    current_time = 0
+    # Bind everything the per-character loop touches to locals
+    push = event_queue.append
+    mark = char_timing.append
+    char_table = CHAR_TABLE
+    tb303_params = TB303_PARAMS
+    consonant_drums = CONSONANT_DRUMS
+    chord_root = NOTE_BASE + MINOR_PENTATONIC[0] + OCTAVE  # One octave above bassline
+    pad_notes = [min(max(chord_root + offset, 0), 127) for offset in PAD_CHORD_NOTES]
+
+    # Lowercase the whole text in one call; fall back to per-character lower() only
+    # when case mapping changes the length (e.g. 'İ') and would misalign positions.
+    # Characters that lowercase to several code points are never in CHAR_TABLE.
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = ''.join(c if len(c) == 1 else '\0' for c in map(str.lower, text))
 
-    for i, ch in enumerate(text):
-        ch_lower = ch.lower()
+    # Every character takes one tick, so the time is the character's position and
+    # non-encodable characters (no output, no MIDI) can be skipped without a visit
+    for m in CHAR_RE.finditer(lowered):
+        i = current_time = m.start()
+        ch = text[i]
+        # One table lookup classifies the character
+        kind, note, velocity, drum_note, drum_velocity = char_table[m.group()]
 
-        if ch == ' ' or ch_lower in PUNCTUATION:
-            char_timing.append((current_time, i, ch))
+        if kind == 'space':
+            mark((current_time, i, ch))
             # TB303: Resonance tweak
-            heapq.heappush(event_queue, (current_time, 'TB303', 'cc', 71, 60))
+            push((current_time, 'TB303', CC, 71, 60))
             # PadSynth: Sustained minor chord
-            chord_root = NOTE_BASE + MINOR_PENTATONIC[0] + OCTAVE  # One octave above bassline
-            for offset in PAD_CHORD_NOTES:
-                note = chord_root + offset
-                note = min(max(note, 0), 127)
-                heapq.heappush(event_queue, (current_time, 'PadSynth', 'on', note, 60))
-                heapq.heappush(event_queue, (current_time + 4, 'PadSynth', 'off', note, 0))
-            current_time += 1
-            continue
-
-        if ch_lower not in ENCODABLE:
-            # Skip console output for non-encodable characters, but advance time
-            current_time += 1
+            for note in pad_notes:
+                push((current_time, 'PadSynth', ON, note, 60))
+                push((current_time + 4, 'PadSynth', OFF, note, 0))
             continue
 
         # Bassline (TB303 device)
-        if ch_lower in VOWELS:
-            rank = VOWEL_ORDER.index(ch_lower)
-            scale_degree = MINOR_PENTATONIC[rank % len(MINOR_PENTATONIC)]
-            note = NOTE_BASE + scale_degree
-            note = min(max(note, 0), 127)
-            velocity = 80
-            duration = 2 if random.random() < 0.6 else 1
-            heapq.heappush(event_queue, (current_time, 'TB303', 'on', note, velocity))
-            heapq.heappush(event_queue, (current_time + duration, 'TB303', 'off', note, 0))
-            if duration > 1:
-                heapq.heappush(event_queue, (current_time, 'TB303', 'cc', 5, 127))
-                heapq.heappush(event_queue, (current_time + duration, 'TB303', 'cc', 5, 0))
-        elif ch_lower in DIGITS:
-            rank = int(ch_lower)
-            scale_degree = MINOR_PENTATONIC[rank % len(MINOR_PENTATONIC)]
-            note = NOTE_BASE + scale_degree
-            note = min(max(note, 0), 127)
-            velocity = 70
-            heapq.heappush(event_queue, (current_time, 'TB303', 'on', note, velocity))
-            heapq.heappush(event_queue, (current_time + 1, 'TB303', 'off', note, 0))
-        elif ch_lower in CONSONANT_ORDER:
-            rank = CONSONANT_ORDER.index(ch_lower)
-            scale_degree = MINOR_PENTATONIC[rank % len(MINOR_PENTATONIC)]
-            note = NOTE_BASE + scale_degree
-            note = min(max(note, 0), 127)
-            velocity = 100
-            heapq.heappush(event_queue, (current_time, 'TB303', 'on', note, velocity))
-            heapq.heappush(event_queue, (current_time + 1, 'TB303', 'off', note, 0))
-            heapq.heappush(event_queue, (current_time, 'TB303', 'cc', 71, 80))
+        glide_chance, cc, cc_value = tb303_params[kind]
+        duration = 2 if glide_chance and rand() < glide_chance else 1
+        # Controllers go out ahead of the notes they shape
+        if duration > 1:
+            push((current_time, 'TB303', CC, 5, 127))
+            push((current_time + duration, 'TB303', CC, 5, 0))
+        if cc is not None:
+            push((current_time, 'TB303', CC, cc, cc_value))
+        push((current_time, 'TB303', ON, note, velocity))
+        push((current_time + duration, 'TB303', OFF, note, 0))
 
         # Drums (BP909 device)
-        if ch_lower in VOWELS:
-            heapq.heappush(event_queue, (current_time, 'BP909', 'on', DRUM_NOTES['kick'], 100))
-            heapq.heappush(event_queue, (current_time + 1, 'BP909', 'off', DRUM_NOTES['kick'], 0))
-        elif ch_lower in DIGITS:
-            heapq.heappush(event_queue, (current_time, 'BP909', 'on', DRUM_NOTES['oh'], 80))
-            heapq.heappush(event_queue, (current_time + 1, 'BP909', 'off', DRUM_NOTES['oh'], 0))
-        elif ch_lower in CONSONANT_ORDER:
-            drum = 'snare' if (i % 4 == 2) else 'clap' if (i % 4 == 0) else 'ch'
-            velocity = 90 if drum in ['snare', 'clap'] else 70
-            heapq.heappush(event_queue, (current_time, 'BP909', 'on', DRUM_NOTES[drum], velocity))
-            heapq.heappush(event_queue, (current_time + 1, 'BP909', 'off', DRUM_NOTES[drum], 0))
-
-        char_timing.append((current_time, i, ch))
-        current_time += 1
-
-    return sorted(event_queue), sorted(char_timing, key=lambda x: x[1])
-
-def play_event_queue(midiouts, event_queue, char_queue):
+        if drum_note is None:
+            drum_note, drum_velocity = consonant_drums[i & 3]
+        push((current_time, 'BP909', ON, drum_note, drum_velocity))
+        push((current_time + 1, 'BP909', OFF, drum_note, 0))
+
+        mark((current_time, i, ch))
+
+    # Ticks are small integers, so distribute into one bucket per tick instead of
+    # sorting. Events keep generation order within a tick, so a note-off pushed for
+    # an earlier character still goes out before a re-triggered note-on. Character
+    # prints go in first (every printed character also emits MIDI at its tick).
+    buckets = [[] for _ in range(max(map(operator.itemgetter(0), event_queue), default=-1) + 1)]
+    for t, _, ch in char_timing:
+        buckets[t].append((None, PRINT, ch, None))
+    for t, device, action, value, param in event_queue:
+        # Bake the raw MIDI message into each event so playback only has to send it
+        buckets[t].append((device, action, value, midi_message(STATUS_BYTES[action], value, param)))
+    return buckets
+
+def wait_until(deadline_ns):
+    """Sleep until just before deadline_ns (perf_counter_ns clock), then spin for the rest"""
+    delay = deadline_ns - SPIN_NS - time.perf_counter_ns()
+    if delay > 0:
+        time.sleep(delay / 1e9)
+    while time.perf_counter_ns() < deadline_ns:
+        pass
+
+def enable_realtime():
+    """Best effort: move playback to SCHED_FIFO and lock memory so page faults can't stall it"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(RT_PRIORITY))
+    except (AttributeError, OSError) as e:
+        print(f"Warning: Could not enable SCHED_FIFO (raise `ulimit -r`, see README): {e}")
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        print(f"Warning: Could not lock memory (raise `ulimit -l`, see README): {os.strerror(ctypes.get_errno())}")
+
+def play_event_queue(midiouts, buckets):
+    enable_realtime()
     active_notes = {device: set() for device in DEVICES}
+    # Resolve each port's send_message once so the hot loop is one dict lookup and a call
+    send = {device: midiout.send_message for device, midiout in midiouts.items()}
+    # Characters are buffered and flushed once per tick, after its MIDI has gone out
+    out_write, out_flush = sys.stdout.write, sys.stdout.flush
     try:
-        events = [(e[0], e[1], e[2], e[3], e[4] if len(e) > 4 else 0) for e in event_queue]
-        events.sort(key=lambda x: x[0])
-
-        event_ptr = 0
-        char_ptr = 0
-        tick = 0
-        max_tick = max([e[0] for e in events] + [t for t, _, _ in char_queue], default=0) + 1
-
-        while tick <= max_tick:
-            while char_ptr < len(char_queue) and char_queue[char_ptr][0] <= tick:
-                _, _, ch = char_queue[char_ptr]
-                print(ch, end='', flush=True)
-                char_ptr += 1
-
-            while event_ptr < len(events) and events[event_ptr][0] == tick:
-                _, device, action, value, param = events[event_ptr]
-                midiout = midiouts[device]
-                if action == 'on':
-                    midiout.send_message([0x90, value, param])
+        max_tick = len(buckets)
+        # Only ticks with something due get a wakeup; idle runs between them are
+        # covered by a single wait, so drop them (and their offsets) up front
+        due = [(tick * TICK_NS, bucket) for tick, bucket in enumerate(buckets) if bucket]
+        t0 = time.perf_counter_ns()
+
+        for offset_ns, bucket in due:
+            # Sleep straight to the next tick with something due; deadlines are
+            # absolute from t0 so oversleeping never accumulates into drift
+            wait_until(t0 + offset_ns)
+
+            # Fire the whole tick back to back, then do the note bookkeeping
+            for device, action, value, msg in bucket:
+                if action == PRINT:
+                    out_write(value)
+                else:
+                    send[device](msg)
+            out_flush()
+            for device, action, value, _ in bucket:
+                if action == ON:
                     active_notes[device].add(value)
-                elif action == 'off':
-                    midiout.send_message([0x80, value, 0])
+                elif action == OFF:
                     active_notes[device].discard(value)
-                elif action == 'cc':
-                    midiout.send_message([0xB0, value, param])
-                event_ptr += 1
 
-            time.sleep(TICK_DURATION)
-            tick += 1
+        # Let the last notes ring for one more tick before the final note-offs
+        wait_until(t0 + (max_tick + 1) * TICK_NS)
 
     finally:
         for device, notes in active_notes.items():
             midiout = midiouts[device]
             for note in notes:
-                midiout.send_message([0x80, note, 0])
+                midiout.send_message(midi_message(STATUS_BYTES[OFF], note, 0))
         print("\nAll notes off.")
 
 def main():
@@ -224,14 +320,18 @@ def main():
         print("Failed to open MIDI ports")
         return
 
-    time.sleep(0.5)  # Delay for port availability
-    for device, (src_port, dst_port) in DEVICES.items():
-        if not connect_midi_ports(src_port, dst_port):
-            print(f"Failed to connect {src_port} to {dst_port}; continuing...")
+    ports = wait_for_ports([src_port for src_port, _ in DEVICES.values()])
+    # Each connect is subprocess and retry-sleep bound, so run them side by side
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(DEVICES)) as pool:
+        connects = {(src_port, dst_port): pool.submit(connect_midi_ports, src_port, dst_port, ports)
+                    for src_port, dst_port in DEVICES.values()}
+        for (src_port, dst_port), connected in connects.items():
+            if not connected.result():
+                print(f"Failed to connect {src_port} to {dst_port}; continuing...")
 
     print(f"Encoding and playing ACID pattern ({len(text)} characters)...\n")
-    event_queue, char_queue = text_to_event_queue(text)
-    play_event_queue(midiouts, event_queue, char_queue)
+    buckets = text_to_event_queue(text)
+    play_event_queue(midiouts, buckets)
 
 if __name__ == "__main__":
     main()
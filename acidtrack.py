@@ -1,26 +1,45 @@
 #!/usr/bin/env python3
+import os
 import time
 import subprocess
 import re
+import operator
+import functools
+import ctypes
+import threading
+import concurrent.futures
+import hashlib
+import pickle
+import tempfile
 import rtmidi
-import heapq
 import random
 
 # Timing constants
 BPM = 135  # Increased for faster feel
 TICKS_PER_BEAT = 4
-TICK_DURATION = 60.0 / BPM / TICKS_PER_BEAT
+TICK_NS = 60 * 1_000_000_000 // (BPM * TICKS_PER_BEAT)  # Integer nanoseconds per tick
+SPIN_NS = 1_000_000  # Busy-wait the last 1 ms before each deadline; sleep() wakeups alone jitter
+RT_PRIORITY = 80  # SCHED_FIFO priority for playback
+MCL_CURRENT, MCL_FUTURE = 1, 2  # mlockall() flags from <sys/mman.h>
 BARS = 32
 BEATS_PER_BAR = 4
 TOTAL_TICKS = BARS * BEATS_PER_BAR * TICKS_PER_BEAT  # 512 ticks
 
+# Pattern cache: the track is fully determined by the seed and this file's code and
+# tables, so it is generated once and reloaded from disk until either changes
+PATTERN_SEED = 42
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'acidtrack')
+
 # ATTENTION AI: IN FL STUDIO C-4 IS 48!!!! NOT 50!!!!
 
 # MIDI constants
 NOTE_BASE = 36  # C3 for basslines
 OCTAVE = 12
 MINOR_PENTATONIC = [0, 3, 5, 7, 10]  # C, Eb, F, G, Bb
+PENTA_LUT = tuple(MINOR_PENTATONIC[i % len(MINOR_PENTATONIC)] for i in range(128))  # Wrapped scale lookup by rank
 PAD_CHORD_NOTES = [0, 3, 7]  # Root, minor 3rd, 5th
+THINNED_CCS = (71, 74)  # TB303 resonance and cutoff
+CC_THRESHOLD = 4  # Skip resonance/cutoff updates smaller than this
 
 # DONT FUCKING CHANGE THIS, IT IS THE CORRECT MAPPING IN VST
 DRUM_NOTES = {
@@ -54,31 +73,69 @@ DEVICES = {
     'BassSub': ('AcidTrack_BassSub', 'virtual-8', 8)     # Sub-bass, channel 8
 }
 
-def get_alsa_ports():
-    """Parse `aconnect -l` and return dict of client_name:port_name -> client:port"""
-    try:
-        out = subprocess.check_output(['aconnect', '-l'], text=True)
+# Event actions, stored as small ints that index the STATUS_BYTES tuples
+ON, OFF, CC = 0, 1, 2
+
+# MIDI status bytes per device, indexed by event action, with the device channel folded in
+STATUS_BYTES = {
+    device: (0x90 | (channel - 1), 0x80 | (channel - 1), 0xB0 | (channel - 1))
+    for device, (_, _, channel) in DEVICES.items()
+}
+
+@functools.lru_cache(maxsize=None)
+def midi_message(status, value, param):
+    """Return the raw 3-byte MIDI message, shared between all identical events"""
+    return bytes((status, value, param))
+
+# `aconnect -l` client and port lines in one pattern, compiled once
+ACONNECT_RE = re.compile(r'^client (\d+): \'([^\']+)\'|^[ \t]+(\d+) \'([^\']+)\'', re.M)
+ALSA_PORTS_CACHE = {'time_ns': None, 'ports': {}}  # Last parsed `aconnect -l` and when it was started
+ALSA_PORTS_LOCK = threading.Lock()  # One `aconnect -l` at a time; workers waiting on it reuse its result
+PORT_POLL_S = 0.05  # How often to look for freshly opened virtual ports
+PORT_WAIT_S = 2.0   # Stop waiting for them after this long
+
+def get_alsa_ports(since_ns=None):
+    """Parse `aconnect -l` and return dict of client_name:port_name -> client:port
+
+    A listing started after since_ns (perf_counter_ns clock) is reused instead
+    of running `aconnect -l` again; since_ns=None always runs it.
+    """
+    with ALSA_PORTS_LOCK:
+        now = time.perf_counter_ns()
+        cached_at = ALSA_PORTS_CACHE['time_ns']
+        if since_ns is not None and cached_at is not None and cached_at > since_ns:
+            return dict(ALSA_PORTS_CACHE['ports'])
+        try:
+            out = subprocess.check_output(['aconnect', '-l'], text=True)
+        except subprocess.CalledProcessError:
+            return {}
         ports = {}
         current_client = None
         current_client_name = None
-        for line in out.splitlines():
-            client_match = re.match(r'^client (\d+): \'([^\']+)\'', line)
-            if client_match:
-                current_client = client_match.group(1)
-                current_client_name = client_match.group(2)
-            port_match = re.match(r'\s+(\d+) \'([^\']+)\'', line)
-            if current_client and port_match:
-                port_num, port_name = port_match.groups()
+        for m in ACONNECT_RE.finditer(out):
+            client, client_name, port_num, port_name = m.groups()
+            if client:
+                current_client = client
+                current_client_name = client_name
+            elif current_client:
                 key = f"{current_client_name}:{port_name.strip()}"
                 ports[key] = f"{current_client}:{port_num}"
-        return ports
-    except subprocess.CalledProcessError:
-        return {}
+        ALSA_PORTS_CACHE['time_ns'] = now
+        ALSA_PORTS_CACHE['ports'] = ports
+        return dict(ports)
 
-def connect_midi_ports(src_name, dst_name):
-    """Connect source port to destination port, retrying up to 5 times"""
-    for _ in range(5):
+def wait_for_ports(port_names):
+    """Poll `aconnect -l` until every named port is listed (or PORT_WAIT_S passes) and return the port map"""
+    deadline = time.monotonic() + PORT_WAIT_S
+    while True:
         ports = get_alsa_ports()
+        if all(any(name in key for key in ports) for name in port_names) or time.monotonic() >= deadline:
+            return ports
+        time.sleep(PORT_POLL_S)
+
+def connect_midi_ports(src_name, dst_name, ports):
+    """Connect source port to destination port, retrying up to 5 times (re-reads the ports only if one is missing)"""
+    for _ in range(5):
         src = next((v for k, v in ports.items() if src_name in k), None)
         dst = next((v for k, v in ports.items() if dst_name in k), None)
         if src and dst:
@@ -91,170 +148,270 @@ def connect_midi_ports(src_name, dst_name):
                 time.sleep(0.5)
         else:
             print(f"Warning: Port not found: {src_name if not src else dst_name}")
+            retry_ns = time.perf_counter_ns()
             time.sleep(0.5)
+            # Any listing started after this retry began is fresh enough, so workers
+            # retrying side by side share one `aconnect -l` run
+            ports = get_alsa_ports(since_ns=retry_ns)
     return False
 
+def thin_cc_events(event_queue):
+    """Drop resonance/cutoff CCs that move less than CC_THRESHOLD from the last value sent (queue must be tick-sorted)"""
+    last_values = {}
+    thinned = []
+    for event in event_queue:
+        _, device, action, value, param = event
+        if action == CC and value in THINNED_CCS:
+            last = last_values.get((device, value))
+            if last is not None and abs(param - last) < CC_THRESHOLD:
+                continue
+            last_values[(device, value)] = param
+        thinned.append(event)
+    return thinned
+
 def generate_acid_patterns():
     """Generate ACID track patterns for 32 bars (512 ticks)"""
-    random.seed(42)  # Consistent patterns
+    rng = random.Random(PATTERN_SEED)  # Consistent patterns
+    rand, randint = rng.random, rng.randint
     event_queue = []
+    # Bind everything the bar loops touch to locals
+    push = event_queue.append
+    ticks_per_beat = TICKS_PER_BEAT
+    ticks_per_bar = BEATS_PER_BAR * TICKS_PER_BEAT
+    kick, snare, clap, rim = DRUM_NOTES['kick'], DRUM_NOTES['snare'], DRUM_NOTES['clap'], DRUM_NOTES['rim']
+    closed_hat, open_hat, crash = DRUM_NOTES['ch'], DRUM_NOTES['oh'], DRUM_NOTES['crash']
+    low_tom, high_tom = DRUM_NOTES['ltom'], DRUM_NOTES['htom']
 
     # TB303: Acid bassline with overlapping slides and dynamic CCs
+    # Even and odd bars alternate between two fixed patterns, so resolve their notes once
+    tb303_rows = []
+    for pattern in ([0, 3, 5, 0, 7, 10, 3, 5], [0, 5, 10, 0, 3, 7, 5, 3]):
+        row = [NOTE_BASE + PENTA_LUT[degree] for degree in pattern]
+        tb303_rows.append([min(max(note, 0), 127) for note in row])
     for bar in range(BARS):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
-        pattern = [0, 3, 5, 0, 7, 10, 3, 5] if bar % 2 == 0 else [0, 5, 10, 0, 3, 7, 5, 3]
-        for i in range(8):
+        start_tick = bar * ticks_per_bar
+        for i, note in enumerate(tb303_rows[bar % 2]):
             tick = start_tick + i * 2
-            if random.random() < 0.95:  # High note density
-                note = NOTE_BASE + MINOR_PENTATONIC[pattern[i] % len(MINOR_PENTATONIC)]
-                note = min(max(note, 0), 127)
-                velocity = 90 + random.randint(-10, 10)
-                duration = 3 if random.random() < 0.7 else 2  # Longer for slides
-                heapq.heappush(event_queue, (tick, 'TB303', 'on', note, velocity))
-                heapq.heappush(event_queue, (tick + duration, 'TB303', 'off', note, 0))
+            if rand() < 0.95:  # High note density
+                velocity = 90 + randint(-10, 10)
+                duration = 3 if rand() < 0.7 else 2  # Longer for slides
+                slide = 127 if rand() < 0.8 else 0  # 80% slide chance
+                resonance = 80 + randint(0, 40)
+                cutoff = 60 + randint(0, 50)
+                # Controllers go out ahead of the note they shape
                 # Overlapping slides
-                heapq.heappush(event_queue, (tick, 'TB303', 'cc', 5, 127 if random.random() < 0.8 else 0))  # 80% slide chance
-                heapq.heappush(event_queue, (tick + duration, 'TB303', 'cc', 5, 0))
+                push((tick, 'TB303', CC, 5, slide))
+                push((tick + duration, 'TB303', CC, 5, 0))
                 # Dynamic resonance and cutoff
-                heapq.heappush(event_queue, (tick, 'TB303', 'cc', 71, 80 + random.randint(0, 40)))
-                heapq.heappush(event_queue, (tick, 'TB303', 'cc', 74, 60 + random.randint(0, 50)))
+                push((tick, 'TB303', CC, 71, resonance))
+                push((tick, 'TB303', CC, 74, cutoff))
+                push((tick, 'TB303', ON, note, velocity))
+                push((tick + duration, 'TB303', OFF, note, 0))
 
     # BassSub: Deep sub-bass
-    for bar in range(BARS):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
-        if bar >= 2:
-            for beat in range(4):
-                tick = start_tick + beat * TICKS_PER_BEAT
-                note = NOTE_BASE - OCTAVE  # C2
-                heapq.heappush(event_queue, (tick, 'BassSub', 'on', note, 100))
-                heapq.heappush(event_queue, (tick + 2, 'BassSub', 'off', note, 0))
+    note = NOTE_BASE - OCTAVE  # C2
+    for bar in range(2, BARS):
+        start_tick = bar * ticks_per_bar
+        for beat in range(4):
+            tick = start_tick + beat * ticks_per_beat
+            push((tick, 'BassSub', ON, note, 100))
+            push((tick + 2, 'BassSub', OFF, note, 0))
 
     # BP909: Dense drum pattern with variation
     for bar in range(BARS):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
+        start_tick = bar * ticks_per_bar
         for beat in range(4):
-            tick = start_tick + beat * TICKS_PER_BEAT
+            tick = start_tick + beat * ticks_per_beat
             # Kick on every beat, with occasional offbeat
-            heapq.heappush(event_queue, (tick, 'BP909', 'on', DRUM_NOTES['kick'], 100))
-            heapq.heappush(event_queue, (tick + 1, 'BP909', 'off', DRUM_NOTES['kick'], 0))
-            if random.random() < 0.2 and beat % 2 == 1:
-                heapq.heappush(event_queue, (tick + 2, 'BP909', 'on', DRUM_NOTES['kick'], 80))
-                heapq.heappush(event_queue, (tick + 3, 'BP909', 'off', DRUM_NOTES['kick'], 0))
+            push((tick, 'BP909', ON, kick, 100))
+            push((tick + 1, 'BP909', OFF, kick, 0))
+            if rand() < 0.2 and beat % 2 == 1:
+                push((tick + 2, 'BP909', ON, kick, 80))
+                push((tick + 3, 'BP909', OFF, kick, 0))
             # Snare on 2 and 4
             if beat % 2 == 1:
-                heapq.heappush(event_queue, (tick, 'BP909', 'on', DRUM_NOTES['snare'], 90))
-                heapq.heappush(event_queue, (tick + 1, 'BP909', 'off', DRUM_NOTES['snare'], 0))
+                push((tick, 'BP909', ON, snare, 90))
+                push((tick + 1, 'BP909', OFF, snare, 0))
             # Clap on offbeats
             if beat % 2 == 1 and bar >= 4:
-                heapq.heappush(event_queue, (tick + 2, 'BP909', 'on', DRUM_NOTES['clap'], 85))
-                heapq.heappush(event_queue, (tick + 3, 'BP909', 'off', DRUM_NOTES['clap'], 0))
+                push((tick + 2, 'BP909', ON, clap, 85))
+                push((tick + 3, 'BP909', OFF, clap, 0))
             # 16th-note closed hi-hats
             for i in range(4):
                 htick = tick + i
-                heapq.heappush(event_queue, (htick, 'BP909', 'on', DRUM_NOTES['ch'], 70 + random.randint(-10, 10)))
-                heapq.heappush(event_queue, (htick + 1, 'BP909', 'off', DRUM_NOTES['ch'], 0))
+                push((htick, 'BP909', ON, closed_hat, 70 + randint(-10, 10)))
+                push((htick + 1, 'BP909', OFF, closed_hat, 0))
             # Open hi-hat on offbeats
             if beat % 2 == 1:
-                heapq.heappush(event_queue, (tick + 2, 'BP909', 'on', DRUM_NOTES['oh'], 80))
-                heapq.heappush(event_queue, (tick + 3, 'BP909', 'off', DRUM_NOTES['oh'], 0))
+                push((tick + 2, 'BP909', ON, open_hat, 80))
+                push((tick + 3, 'BP909', OFF, open_hat, 0))
             # Toms and rimshots for variation
-            if bar >= 8 and random.random() < 0.3:
-                tom = 'ltom' if random.random() < 0.5 else 'htom'
-                heapq.heappush(event_queue, (tick + 3, 'BP909', 'on', DRUM_NOTES[tom], 80))
-                heapq.heappush(event_queue, (tick + 4, 'BP909', 'off', DRUM_NOTES[tom], 0))
-            if bar >= 12 and random.random() < 0.2:
-                heapq.heappush(event_queue, (tick + 1, 'BP909', 'on', DRUM_NOTES['rim'], 75))
-                heapq.heappush(event_queue, (tick + 2, 'BP909', 'off', DRUM_NOTES['rim'], 0))
+            if bar >= 8 and rand() < 0.3:
+                tom = low_tom if rand() < 0.5 else high_tom
+                push((tick + 3, 'BP909', ON, tom, 80))
+                push((tick + 4, 'BP909', OFF, tom, 0))
+            if bar >= 12 and rand() < 0.2:
+                push((tick + 1, 'BP909', ON, rim, 75))
+                push((tick + 2, 'BP909', OFF, rim, 0))
             # Crash every 4 bars
             if beat == 0 and bar % 4 == 0:
-                heapq.heappush(event_queue, (tick, 'BP909', 'on', DRUM_NOTES['crash'], 90))
-                heapq.heappush(event_queue, (tick + 2, 'BP909', 'off', DRUM_NOTES['crash'], 0))
+                push((tick, 'BP909', ON, crash, 90))
+                push((tick + 2, 'BP909', OFF, crash, 0))
 
     # LeadSynth: Melodic stabs
+    lead_notes = [min(max(NOTE_BASE + OCTAVE + degree, 0), 127) for degree in MINOR_PENTATONIC]
     for bar in range(4, BARS):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
+        start_tick = bar * ticks_per_bar
         for beat in [0, 2]:
-            tick = start_tick + beat * TICKS_PER_BEAT
-            note = NOTE_BASE + OCTAVE + MINOR_PENTATONIC[random.randint(0, 4)]
-            note = min(max(note, 0), 127)
-            heapq.heappush(event_queue, (tick, 'LeadSynth', 'on', note, 80))
-            heapq.heappush(event_queue, (tick + 2, 'LeadSynth', 'off', note, 0))
+            tick = start_tick + beat * ticks_per_beat
+            note = lead_notes[randint(0, 4)]
+            push((tick, 'LeadSynth', ON, note, 80))
+            push((tick + 2, 'LeadSynth', OFF, note, 0))
 
     # ArpSynth: Arpeggiated pattern
+    arp_notes = [0, 3, 7, 10, 7, 3]
+    arp_row = []
+    for i in range(8):
+        note = NOTE_BASE + OCTAVE * 2 + PENTA_LUT[arp_notes[i % len(arp_notes)]]
+        arp_row.append(min(max(note, 0), 127))
     for bar in range(8, BARS):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
-        arp_notes = [0, 3, 7, 10, 7, 3]
-        for i in range(8):
+        start_tick = bar * ticks_per_bar
+        for i, note in enumerate(arp_row):
             tick = start_tick + i * 2
-            note = NOTE_BASE + OCTAVE * 2 + MINOR_PENTATONIC[arp_notes[i % len(arp_notes)] % len(MINOR_PENTATONIC)]
-            note = min(max(note, 0), 127)
-            heapq.heappush(event_queue, (tick, 'ArpSynth', 'on', note, 75))
-            heapq.heappush(event_queue, (tick + 1, 'ArpSynth', 'off', note, 0))
+            push((tick, 'ArpSynth', ON, note, 75))
+            push((tick + 1, 'ArpSynth', OFF, note, 0))
 
     # PadSynth: Ambient chords
+    chord_root = NOTE_BASE + OCTAVE + MINOR_PENTATONIC[0]
+    chord = [min(max(chord_root + offset, 0), 127) for offset in PAD_CHORD_NOTES]
     for bar in range(2, 28):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
-        chord_root = NOTE_BASE + OCTAVE + MINOR_PENTATONIC[0]
-        for offset in PAD_CHORD_NOTES:
-            note = chord_root + offset
-            note = min(max(note, 0), 127)
-            heapq.heappush(event_queue, (start_tick, 'PadSynth', 'on', note, 60))
-            heapq.heappush(event_queue, (start_tick + 16, 'PadSynth', 'off', note, 0))
+        start_tick = bar * ticks_per_bar
+        for note in chord:
+            push((start_tick, 'PadSynth', ON, note, 60))
+            push((start_tick + 16, 'PadSynth', OFF, note, 0))
 
     # SampleBank1: Vocal chops
     for bar in range(4, BARS, 4):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
-        heapq.heappush(event_queue, (start_tick, 'SampleBank1', 'on', SAMPLE_NOTES['vocal1'], 100))
-        heapq.heappush(event_queue, (start_tick + 4, 'SampleBank1', 'off', SAMPLE_NOTES['vocal1'], 0))
+        start_tick = bar * ticks_per_bar
+        push((start_tick, 'SampleBank1', ON, SAMPLE_NOTES['vocal1'], 100))
+        push((start_tick + 4, 'SampleBank1', OFF, SAMPLE_NOTES['vocal1'], 0))
         if bar >= 12:
-            heapq.heappush(event_queue, (start_tick + 8, 'SampleBank1', 'on', SAMPLE_NOTES['vocal2'], 100))
-            heapq.heappush(event_queue, (start_tick + 12, 'SampleBank1', 'off', SAMPLE_NOTES['vocal2'], 0))
+            push((start_tick + 8, 'SampleBank1', ON, SAMPLE_NOTES['vocal2'], 100))
+            push((start_tick + 12, 'SampleBank1', OFF, SAMPLE_NOTES['vocal2'], 0))
 
     # SampleBank2: FX (riser in breakdown)
     for bar in range(20, 24):
-        start_tick = bar * BEATS_PER_BAR * TICKS_PER_BEAT
-        heapq.heappush(event_queue, (start_tick, 'SampleBank2', 'on', SAMPLE_NOTES['riser'], 90))
-        heapq.heappush(event_queue, (start_tick + 16, 'SampleBank2', 'off', SAMPLE_NOTES['riser'], 0))
+        start_tick = bar * ticks_per_bar
+        push((start_tick, 'SampleBank2', ON, SAMPLE_NOTES['riser'], 90))
+        push((start_tick + 16, 'SampleBank2', OFF, SAMPLE_NOTES['riser'], 0))
+
+    # Stable sort on tick alone keeps generation order within a tick, so a note-off
+    # pushed for an earlier step still goes out before a re-triggered note-on
+    event_queue.sort(key=operator.itemgetter(0))
+    event_queue = thin_cc_events(event_queue)
+    # Bake the raw MIDI message into each event so playback only has to send it
+    return [(t, device, action, value, midi_message(STATUS_BYTES[device][action], value, param))
+            for t, device, action, value, param in event_queue]
 
-    return sorted(event_queue)
+def pattern_cache_path():
+    """Return the cache file for the generated track, keyed on this module's source and the seed"""
+    with open(__file__, 'rb') as f:
+        key = hashlib.sha1(f.read())
+    key.update(repr(PATTERN_SEED).encode())
+    return os.path.join(CACHE_DIR, key.hexdigest()[:16] + '.pkl')
+
+def is_event_queue(event_queue):
+    """Check that a loaded cache holds what generate_acid_patterns returns: (tick, device, action, value, msg) events"""
+    return isinstance(event_queue, list) and all(
+        isinstance(event, tuple) and len(event) == 5
+        and isinstance(event[0], int) and event[1] in DEVICES and event[2] in (ON, OFF, CC)
+        and isinstance(event[3], int) and isinstance(event[4], bytes) and len(event[4]) == 3
+        for event in event_queue)
+
+def load_acid_patterns():
+    """Load the generated track from the disk cache, generating and storing it on a miss"""
+    path = pattern_cache_path()
+    try:
+        with open(path, 'rb') as f:
+            event_queue = pickle.load(f)
+        if is_event_queue(event_queue):
+            return event_queue
+        print(f"Warning: Ignoring malformed pattern cache {path}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # A corrupt or foreign cache only costs a regeneration, never the run
+        print(f"Warning: Ignoring unreadable pattern cache {path}: {e}")
+    event_queue = generate_acid_patterns()
+    tmp_path = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write aside and rename, so a concurrent or interrupted run never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(event_queue, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not write pattern cache {path}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return event_queue
+
+def wait_until(deadline_ns):
+    """Sleep until just before deadline_ns (perf_counter_ns clock), then spin for the rest"""
+    delay = deadline_ns - SPIN_NS - time.perf_counter_ns()
+    if delay > 0:
+        time.sleep(delay / 1e9)
+    while time.perf_counter_ns() < deadline_ns:
+        pass
+
+def enable_realtime():
+    """Best effort: move playback to SCHED_FIFO and lock memory so page faults can't stall it"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(RT_PRIORITY))
+    except (AttributeError, OSError) as e:
+        print(f"Warning: Could not enable SCHED_FIFO (raise `ulimit -r`, see README): {e}")
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        print(f"Warning: Could not lock memory (raise `ulimit -l`, see README): {os.strerror(ctypes.get_errno())}")
 
 def play_event_queue(midiouts, event_queue):
+    enable_realtime()
     active_notes = {device: set() for device in DEVICES}
+    # Resolve each port's send_message once so the hot loop is one dict lookup and a call
+    send = {device: midiout.send_message for device, midiout in midiouts.items()}
     try:
-        events = [(e[0], e[1], e[2], e[3], e[4] if len(e) > 4 else 0) for e in event_queue]
-        events.sort(key=lambda x: x[0])
-
         event_ptr = 0
-        tick = 0
-        max_tick = max([e[0] for e in events], default=0) + 1
-
-        while tick <= max_tick:
-            while event_ptr < len(events) and events[event_ptr][0] == tick:
-                _, device, action, value, param = events[event_ptr]
-                channel = DEVICES[device][2] - 1  # MIDI channels 0-15
-                midiout = midiouts[device]
-                if action == 'on':
-                    midiout.send_message([0x90 | channel, value, param])
+        max_tick = (event_queue[-1][0] if event_queue else 0) + 1
+        t0 = time.perf_counter_ns()
+
+        while event_ptr < len(event_queue):
+            # Sleep straight to the next tick with events; deadlines are absolute
+            # from t0 so oversleeping never accumulates into drift
+            tick = event_queue[event_ptr][0]
+            wait_until(t0 + tick * TICK_NS)
+
+            # Fire the whole tick back to back, then do the note bookkeeping
+            start = event_ptr
+            while event_ptr < len(event_queue) and event_queue[event_ptr][0] == tick:
+                _, device, action, value, msg = event_queue[event_ptr]
+                send[device](msg)
+                event_ptr += 1
+            for _, device, action, value, _ in event_queue[start:event_ptr]:
+                if action == ON:
                     active_notes[device].add(value)
-#                    print(f"Sending {device} note on: {value} (channel {channel + 1}) at tick {tick}")
-                elif action == 'off':
-                    midiout.send_message([0x80 | channel, value, 0])
+                elif action == OFF:
                     active_notes[device].discard(value)
-#                    print(f"Sending {device} note off: {value} (channel {channel + 1}) at tick {tick}")
-                elif action == 'cc':
-                    midiout.send_message([0xB0 | channel, value, param])
-#                    print(f"Sending {device} CC {value}: {param} (channel {channel + 1}) at tick {tick}")
-                event_ptr += 1
 
-            time.sleep(TICK_DURATION)
-            tick += 1
+        # Let the last notes ring for one more tick before the final note-offs
+        wait_until(t0 + (max_tick + 1) * TICK_NS)
 
     finally:
         for device, notes in active_notes.items():
-            channel = DEVICES[device][2] - 1
+            status_off = STATUS_BYTES[device][OFF]
             midiout = midiouts[device]
             for note in notes:
-                midiout.send_message([0x80 | channel, note, 0])
+                midiout.send_message(midi_message(status_off, note, 0))
         print("\nAll notes off.")
 
 def main():
@@ -268,13 +425,17 @@ def main():
         print("Failed to open MIDI ports")
         return
 
-    time.sleep(0.5)  # Increased for reliable ALSA connections
-    for device, (src_port, dst_port, _) in DEVICES.items():
-        if not connect_midi_ports(src_port, dst_port):
-            print(f"Failed to connect {src_port} to {dst_port}; continuing...")
+    ports = wait_for_ports([src_port for src_port, _, _ in DEVICES.values()])
+    # Each connect is subprocess and retry-sleep bound, so run them side by side
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(DEVICES)) as pool:
+        connects = {(src_port, dst_port): pool.submit(connect_midi_ports, src_port, dst_port, ports)
+                    for src_port, dst_port, _ in DEVICES.values()}
+        for (src_port, dst_port), connected in connects.items():
+            if not connected.result():
+                print(f"Failed to connect {src_port} to {dst_port}; continuing...")
 
     print(f"Generating and playing ACID track ({BARS} bars)...\n")
-    event_queue = generate_acid_patterns()
+    event_queue = load_acid_patterns()
     play_event_queue(midiouts, event_queue)
 
 if __name__ == "__main__":